@@ -15,29 +15,69 @@ import sqlite3
 from datetime import datetime
 import re
 import tempfile
+import threading
 import zipfile
 
 # Import our processing functions
-from data_processing import process_data, generate_insights
+from data_processing import (
+    process_data,
+    generate_insights,
+    read_workbook_sheets,
+    REQUIRED_SHEETS,
+)
+from parsing import parse_customer_data
 from download import (
     create_processed_excel_file,
     create_csv_exports,
     create_geolocation_kml,
     add_download_routes_to_app,
+    remember_processing_result,
 )
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "your-secret-key-here"
 app.config["UPLOAD_FOLDER"] = "uploads"
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+app.config["CSV_ZIP_LEVEL"] = 1  # Deflate level for CSV export ZIPs (1 = fastest)
+app.config["EXPORT_CACHE_FOLDER"] = "export_cache"  # Generated download files
+app.config["EXPORT_CACHE_MAX_FILES"] = 32
 
-# Create uploads directory if it doesn't exist
+# Create uploads and export cache directories if they don't exist
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+os.makedirs(app.config["EXPORT_CACHE_FOLDER"], exist_ok=True)
+
+
+# Upload log database, shared by all requests through a single connection
+app.config["DATABASE"] = "upload_logs.db"
+db_lock = threading.Lock()
+
+INSERT_UPLOAD_LOG_SQL = """
+    INSERT INTO upload_logs
+    (upload_timestamp, filename, transactions_count, customers_count, products_count,
+     file_path, processed, total_revenue, top_customer_id, processing_timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def get_db():
+    """Return the shared SQLite connection, opening it on first use"""
+    conn = app.config.get("DB_CONNECTION")
+    if conn is None:
+        conn = sqlite3.connect(app.config["DATABASE"], check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        app.config["DB_CONNECTION"] = conn
+    return conn
 
 
 # Initialize SQLite database
 def init_db():
-    conn = sqlite3.connect("upload_logs.db")
+    with db_lock:
+        _init_db(get_db())
+
+
+def _init_db(conn):
     cursor = conn.cursor()
 
     # Create table with new schema
@@ -74,59 +114,25 @@ def init_db():
         print("Database schema updated successfully!")
 
     conn.commit()
-    conn.close()
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ["xlsx", "xls"]
 
 
-def parse_customer_data(raw_data):
-    """Parse the malformed customer data from the single column format"""
-    customers = []
-
-    for row in raw_data:
-        if pd.isna(row) or not isinstance(row, str):
-            continue
-
-        # Remove curly braces and split by underscore
-        cleaned = row.strip("{}")
-        parts = cleaned.split("_")
-
-        if len(parts) >= 6:
-            try:
-                customer_data = {
-                    "customer_id": parts[0],
-                    "name": parts[1],
-                    "email": parts[2],
-                    "dob": parts[3],
-                    "address": parts[4],
-                    "created_date": float(parts[5]),  # Excel date serial number
-                }
-                customers.append(customer_data)
-            except (ValueError, IndexError) as e:
-                print(f"Error parsing customer row: {row}, Error: {e}")
-                continue
-
-    return pd.DataFrame(customers)
-
-
 def validate_excel_structure(file_path):
-    """Validate that the Excel file has the correct structure"""
+    """Validate that the Excel file (a path or its raw bytes) has the right structure"""
     try:
         # Read all sheets
-        xl_file = pd.ExcelFile(file_path)
-        required_sheets = ["Transactions", "Customers", "Products"]
+        sheets = read_workbook_sheets(file_path)
 
         # Check if all required sheets exist
-        missing_sheets = [
-            sheet for sheet in required_sheets if sheet not in xl_file.sheet_names
-        ]
+        missing_sheets = [sheet for sheet in REQUIRED_SHEETS if sheet not in sheets]
         if missing_sheets:
             return False, f"Missing required sheets: {', '.join(missing_sheets)}"
 
         # Validate Transactions sheet
-        transactions_df = pd.read_excel(file_path, sheet_name="Transactions")
+        transactions_df = sheets["Transactions"]
         required_transaction_cols = [
             "transaction_id",
             "customer_id",
@@ -147,7 +153,7 @@ def validate_excel_structure(file_path):
             )
 
         # Validate Products sheet
-        products_df = pd.read_excel(file_path, sheet_name="Products")
+        products_df = sheets["Products"]
         required_product_cols = [
             "product_code",
             "product_name",
@@ -164,14 +170,14 @@ def validate_excel_structure(file_path):
             )
 
         # For Customers sheet, we'll handle the special parsing
-        customers_raw = pd.read_excel(file_path, sheet_name="Customers")
+        customers_raw = sheets["Customers"]
 
         # Check if customers data can be parsed
         if customers_raw.empty:
             return False, "Customers sheet is empty"
 
         # Try to parse customer data
-        customers_df = parse_customer_data(customers_raw.iloc[:, 0])
+        customers_df = parse_customer_data(customers_raw)
         if customers_df.empty:
             return False, "Could not parse customer data from the provided format"
 
@@ -197,6 +203,12 @@ def validate_excel_structure(file_path):
             "transactions_sample": transactions_df.head(3).to_dict("records"),
             "customers_sample": customers_df.head(3).to_dict("records"),
             "products_sample": products_df.head(3).to_dict("records"),
+            # Parsed frames, so process_data does not have to parse them again
+            "dataframes": {
+                "transactions": transactions_df,
+                "products": products_df,
+                "customers": customers_df,
+            },
         }
 
     except Exception as e:
@@ -205,9 +217,6 @@ def validate_excel_structure(file_path):
 
 def log_upload(filename, file_path, validation_result, processing_result=None):
     """Log upload details to SQLite database"""
-    conn = sqlite3.connect("upload_logs.db")
-    cursor = conn.cursor()
-
     processed = processing_result is not None
     total_revenue = (
         processing_result["summary_stats"]["total_revenue"] if processed else None
@@ -223,29 +232,30 @@ def log_upload(filename, file_path, validation_result, processing_result=None):
             "top_10_customers"
         ][0]["customer_id"]
 
-    cursor.execute(
-        """
-        INSERT INTO upload_logs 
-        (upload_timestamp, filename, transactions_count, customers_count, products_count, 
-         file_path, processed, total_revenue, top_customer_id, processing_timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """,
-        (
-            datetime.now().isoformat(),
-            filename,
-            validation_result["transactions_count"],
-            validation_result["customers_count"],
-            validation_result["products_count"],
-            file_path,
-            processed,
-            total_revenue,
-            top_customer,
-            datetime.now().isoformat() if processed else None,
-        ),
+    insert_upload_logs(
+        [
+            (
+                datetime.now().isoformat(),
+                filename,
+                validation_result["transactions_count"],
+                validation_result["customers_count"],
+                validation_result["products_count"],
+                file_path,
+                processed,
+                total_revenue,
+                top_customer,
+                datetime.now().isoformat() if processed else None,
+            )
+        ]
     )
 
-    conn.commit()
-    conn.close()
+
+def insert_upload_logs(rows):
+    """Insert upload log rows (in INSERT_UPLOAD_LOG_SQL column order) in one transaction"""
+    with db_lock:
+        conn = get_db()
+        with conn:
+            conn.executemany(INSERT_UPLOAD_LOG_SQL, rows)
 
 
 @app.route("/")
@@ -270,12 +280,18 @@ def upload_file():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{timestamp}_{filename}"
         file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(file_path)
 
-        # Validate the file structure
-        is_valid, validation_result = validate_excel_structure(file_path)
+        # Validate the file structure straight from the uploaded bytes
+        file_content = file.read()
+        is_valid, validation_result = validate_excel_structure(file_content)
 
         if is_valid:
+            dataframes = validation_result.pop("dataframes")
+
+            # Keep valid uploads on disk for the download routes
+            with open(file_path, "wb") as f:
+                f.write(file_content)
+
             # Process the data (Step 3 & 4)
             try:
                 # Check if user wants geolocation (could be a form parameter)
@@ -285,12 +301,17 @@ def upload_file():
                 )  # Set as environment variable
 
                 processing_result = process_data(
-                    file_path,
+                    dataframes=dataframes,
                     use_geolocation=use_geolocation,
                     google_api_key=google_api_key,
                 )
                 insights = generate_insights(processing_result)
 
+                # Let the download routes reuse this result and its geocoding
+                remember_processing_result(
+                    file_path, processing_result, geocoded=use_geolocation
+                )
+
                 # Log the successful upload with processing results
                 log_upload(filename, file_path, validation_result, processing_result)
 
@@ -314,8 +335,6 @@ def upload_file():
                     result=validation_result,
                 )
         else:
-            # Remove the invalid file
-            os.remove(file_path)
             flash(f"File validation failed: {validation_result}", "error")
             return redirect(url_for("index"))
     else:
@@ -326,15 +345,14 @@ def upload_file():
 @app.route("/logs")
 def view_logs():
     """View upload logs"""
-    conn = sqlite3.connect("upload_logs.db")
-    cursor = conn.cursor()
-    cursor.execute(
+    with db_lock:
+        cursor = get_db().cursor()
+        cursor.execute(
+            """
+            SELECT * FROM upload_logs ORDER BY upload_timestamp DESC
         """
-        SELECT * FROM upload_logs ORDER BY upload_timestamp DESC
-    """
-    )
-    logs = cursor.fetchall()
-    conn.close()
+        )
+        logs = cursor.fetchall()
 
     return render_template("logs.html", logs=logs)
 
@@ -1,8 +1,13 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+import os
 import re
 
+from parsing import parse_customer_data, convert_excel_date
+
 # Import geolocation functionality
 from geolocation_service import (
     add_geolocation_to_customers,
@@ -10,41 +15,107 @@ from geolocation_service import (
 )
 
 
-def convert_excel_date(excel_date):
-    """Convert Excel date serial number to datetime"""
+# Sheets every uploaded workbook must provide
+REQUIRED_SHEETS = ["Transactions", "Customers", "Products"]
+
+
+def open_excel_file(file_path):
+    """Open a workbook with the Rust-backed calamine engine when available"""
     try:
-        if pd.isna(excel_date):
-            return None
-        # Excel epoch starts from 1900-01-01, but Excel incorrectly treats 1900 as a leap year
-        # So we need to adjust by subtracting 2 days
-        if isinstance(excel_date, (int, float)):
-            return pd.to_datetime("1899-12-30") + pd.Timedelta(days=excel_date)
-        return pd.to_datetime(excel_date)
-    except:
-        return None
-
-
-def process_data(file_path, use_geolocation=True, google_api_key=None):
+        return pd.ExcelFile(file_path, engine="calamine")
+    except (ImportError, ValueError):
+        # python-calamine missing (or pandas < 2.2): let pandas pick its default
+        # engine, which opens .xlsx files with openpyxl in read-only mode
+        return pd.ExcelFile(file_path)
+
+
+def _read_first_column(xl_file, sheet):
+    """Stream the first column of a sheet without building a DataFrame"""
+    if xl_file.engine == "calamine":
+        rows = xl_file.book.get_sheet_by_name(sheet).iter_rows()
+        return pd.Series((row[0] if row else None for row in rows), dtype=object)
+    if xl_file.engine == "openpyxl":
+        rows = xl_file.book[sheet].iter_rows(max_col=1, values_only=True)
+        return pd.Series((row[0] for row in rows), dtype=object)
+    return xl_file.parse(sheet, header=None, dtype=str).iloc[:, 0]
+
+
+def _parse_sheet(xl_file, sheet):
+    if sheet == "Customers":
+        # Only the first column holds data: the free-form {..._..._...} strings
+        return _read_first_column(xl_file, sheet)
+    return xl_file.parse(sheet)
+
+
+def _parse_workbook(source):
+    """Parse the required sheets from a single ExcelFile handle"""
+    with open_excel_file(source) as xl_file:
+        return {
+            sheet: _parse_sheet(xl_file, sheet)
+            for sheet in REQUIRED_SHEETS
+            if sheet in xl_file.sheet_names
+        }
+
+
+@lru_cache(maxsize=4)
+def _read_workbook_sheets(file_path, mtime):
+    return _parse_workbook(file_path)
+
+
+def read_workbook_sheets(source):
+    """
+    Read the Transactions, Customers and Products sheets of a workbook, given
+    either its path or its raw bytes (e.g. an upload that is not on disk yet).
+    Customers is returned as a Series of the raw first-column values.
+    Sheets read from a path are cached by (path, mtime) so repeated reads of a
+    saved upload share one parse; callers get their own copies. Raw bytes are
+    parsed directly: the upload route hands its parsed frames straight to
+    process_data, so a cache entry would only keep the upload in memory.
+    """
+    if isinstance(source, bytes):
+        return _parse_workbook(BytesIO(source))
+
+    sheets = _read_workbook_sheets(source, os.path.getmtime(source))
+    return {sheet: df.copy() for sheet, df in sheets.items()}
+
+
+def _shared_category_dtype(*columns):
+    """Categorical dtype covering the values of all columns, sorted when possible"""
+    return pd.CategoricalDtype(
+        pd.Categorical(pd.concat(columns, ignore_index=True).dropna()).categories
+    )
+
+
+def process_data(
+    file_path=None, use_geolocation=True, google_api_key=None, dataframes=None
+):
     """
     Main function to process Excel data and perform all required analyses
+    file_path may also be the workbook's raw bytes. Alternatively pass the
+    "dataframes" returned by validate_excel_structure to skip reading and parsing
+    the workbook again; those frames are modified in place.
     Returns a dictionary with all processed results
     """
 
-    # Read all sheets
-    transactions_df = pd.read_excel(file_path, sheet_name="Transactions")
-    products_df = pd.read_excel(file_path, sheet_name="Products")
-    customers_raw = pd.read_excel(file_path, sheet_name="Customers")
+    if dataframes is None:
+        # Read all sheets
+        sheets = read_workbook_sheets(file_path)
+        transactions_df = sheets["Transactions"]
+        products_df = sheets["Products"]
+        customers_raw = sheets["Customers"]
 
-    # Parse customers data from the special format
-    customers_df = parse_customer_data(customers_raw.iloc[:, 0])
+        # Parse customers data from the special format
+        customers_df = parse_customer_data(customers_raw)
+    else:
+        transactions_df = dataframes["transactions"]
+        products_df = dataframes["products"]
+        customers_df = dataframes["customers"]
 
     # Convert date columns
     transactions_df["transaction_date"] = pd.to_datetime(
         transactions_df["transaction_date"], origin="1899-12-30", unit="D"
     )
-    customers_df["created_date"] = customers_df["created_date"].apply(
-        convert_excel_date
-    )
+    customers_df["created_date"] = convert_excel_date(customers_df["created_date"])
     customers_df["dob"] = pd.to_datetime(customers_df["dob"])
 
     # Ensure amount is numeric
@@ -52,6 +123,22 @@ def process_data(file_path, use_geolocation=True, google_api_key=None):
         transactions_df["amount"], errors="coerce"
     )
 
+    # Store join/group keys as categoricals sharing one set of categories, so
+    # merges, groupbys and pivots work on integer codes instead of strings
+    customer_ids = _shared_category_dtype(
+        transactions_df["customer_id"], customers_df["customer_id"]
+    )
+    product_codes = _shared_category_dtype(
+        transactions_df["product_code"], products_df["product_code"]
+    )
+    transactions_df["customer_id"] = transactions_df["customer_id"].astype(customer_ids)
+    customers_df["customer_id"] = customers_df["customer_id"].astype(customer_ids)
+    transactions_df["product_code"] = transactions_df["product_code"].astype(
+        product_codes
+    )
+    products_df["product_code"] = products_df["product_code"].astype(product_codes)
+    products_df["category"] = products_df["category"].astype("category")
+
     # Step 4: Add geolocation data to customers
     geolocation_insights = None
     if use_geolocation:
@@ -63,8 +150,13 @@ def process_data(file_path, use_geolocation=True, google_api_key=None):
         )
         geolocation_insights = generate_geolocation_insights(customers_df)
 
+    # Per-customer transaction aggregates shared by steps 3a and 3d
+    customer_aggregates = aggregate_customer_transactions(transactions_df)
+
     # Step 3a: Detect customer address changes and keep history
-    address_history = detect_address_changes(customers_df, transactions_df)
+    address_history = detect_address_changes(
+        customers_df, transactions_df, customer_aggregates
+    )
 
     # Step 3b: Calculate total transaction amount for each customer by product category
     customer_category_totals = calculate_customer_category_totals(
@@ -77,7 +169,9 @@ def process_data(file_path, use_geolocation=True, google_api_key=None):
     )
 
     # Step 3d: Rank all customers by total purchase value
-    customer_rankings = rank_customers_by_total_value(transactions_df)
+    customer_rankings = rank_customers_by_total_value(
+        transactions_df, customer_aggregates
+    )
 
     return {
         "processed_data": {
@@ -126,37 +220,22 @@ def process_data(file_path, use_geolocation=True, google_api_key=None):
     }
 
 
-def parse_customer_data(raw_data):
-    """Parse the malformed customer data from the single column format"""
-    customers = []
-
-    for row in raw_data:
-        if pd.isna(row) or not isinstance(row, str):
-            continue
-
-        # Remove curly braces and split by underscore
-        cleaned = row.strip("{}")
-        parts = cleaned.split("_")
-
-        if len(parts) >= 6:
-            try:
-                customer_data = {
-                    "customer_id": parts[0],
-                    "name": parts[1],
-                    "email": parts[2],
-                    "dob": parts[3],
-                    "address": parts[4],
-                    "created_date": float(parts[5]),  # Excel date serial number
-                }
-                customers.append(customer_data)
-            except (ValueError, IndexError) as e:
-                print(f"Error parsing customer row: {row}, Error: {e}")
-                continue
-
-    return pd.DataFrame(customers)
+def aggregate_customer_transactions(transactions_df):
+    """
+    Aggregate transactions per customer in a single groupby pass, producing the
+    columns needed by detect_address_changes and rank_customers_by_total_value
+    """
+    return transactions_df.groupby("customer_id", observed=True).agg(
+        total_spent=("amount", "sum"),
+        transaction_count=("amount", "count"),
+        avg_transaction=("amount", "mean"),
+        first_transaction=("transaction_date", "min"),
+        last_transaction=("transaction_date", "max"),
+        total_transactions=("transaction_date", "count"),
+    )
 
 
-def detect_address_changes(customers_df, transactions_df):
+def detect_address_changes(customers_df, transactions_df, customer_aggregates=None):
     """
     Detect changes in customer addresses over time and keep a history
 
@@ -166,17 +245,11 @@ def detect_address_changes(customers_df, transactions_df):
     """
 
     # Get customer transaction timeline
-    customer_transactions = (
-        transactions_df.groupby("customer_id")
-        .agg({"transaction_date": ["min", "max", "count"]})
-        .round(2)
-    )
-    customer_transactions.columns = [
-        "first_transaction",
-        "last_transaction",
-        "total_transactions",
-    ]
-    customer_transactions = customer_transactions.reset_index()
+    if customer_aggregates is None:
+        customer_aggregates = aggregate_customer_transactions(transactions_df)
+    customer_transactions = customer_aggregates[
+        ["first_transaction", "last_transaction", "total_transactions"]
+    ].reset_index()
 
     # Merge with customer data
     customer_timeline = customers_df.merge(
@@ -184,31 +257,29 @@ def detect_address_changes(customers_df, transactions_df):
     )
 
     # Create address history structure
-    address_history = []
-
-    for _, customer in customer_timeline.iterrows():
-        # For this dataset, we'll create a single address record per customer
-        # In a real scenario, you'd have multiple address records over time
-        address_record = {
-            "customer_id": customer["customer_id"],
-            "address": customer["address"],
-            "effective_from": customer["created_date"],
-            "effective_to": (
-                customer["last_transaction"]
-                if pd.notna(customer["last_transaction"])
-                else customer["created_date"]
+    # For this dataset, we'll create a single address record per customer
+    # In a real scenario, you'd have multiple address records over time
+    has_transactions = customer_timeline["last_transaction"].notna()
+    address_history_df = pd.DataFrame(
+        {
+            "customer_id": customer_timeline["customer_id"],
+            "address": customer_timeline["address"],
+            "effective_from": customer_timeline["created_date"],
+            "effective_to": customer_timeline["last_transaction"].where(
+                has_transactions, customer_timeline["created_date"]
             ),
             "is_current": True,
             "change_detected": False,  # No changes in this dataset
             "days_active": (
-                (customer["last_transaction"] - customer["created_date"]).days
-                if pd.notna(customer["last_transaction"])
-                else 0
+                (
+                    customer_timeline["last_transaction"]
+                    - customer_timeline["created_date"]
+                )
+                .dt.days.where(has_transactions, 0)
+                .astype("int64")
             ),
         }
-        address_history.append(address_record)
-
-    address_history_df = pd.DataFrame(address_history)
+    )
 
     # Identify customers who might have address changes (heuristic)
     # Customers with very long transaction periods might have moved
@@ -232,45 +303,49 @@ def calculate_customer_category_totals(transactions_df, products_df):
     Calculate total transaction amount of each customer for each product category
     """
 
-    # Merge transactions with products to get categories
-    transactions_with_categories = transactions_df.merge(
-        products_df[["product_code", "category"]], on="product_code", how="left"
+    # Look up each transaction's category by product code
+    code_to_category = products_df.drop_duplicates("product_code").set_index(
+        "product_code"
+    )["category"]
+    transactions_with_categories = pd.DataFrame(
+        {
+            "customer_id": transactions_df["customer_id"],
+            "category": transactions_df["product_code"].map(code_to_category),
+            "amount": transactions_df["amount"],
+        }
     )
 
-    # Group by customer and category, sum amounts
-    customer_category_totals = (
-        transactions_with_categories.groupby(["customer_id", "category"])["amount"]
-        .sum()
-        .reset_index()
+    # Sum amounts per customer with categories as columns
+    customer_category_pivot = transactions_with_categories.pivot_table(
+        index="customer_id",
+        columns="category",
+        values="amount",
+        aggfunc="sum",
+        fill_value=0,
+        observed=True,
     )
 
-    # Pivot to get categories as columns
-    customer_category_pivot = customer_category_totals.pivot(
-        index="customer_id", columns="category", values="amount"
-    ).fillna(0)
-
     # Add total column
     customer_category_pivot["Total_Spending"] = customer_category_pivot.sum(axis=1)
 
     # Reset index to make customer_id a column
     customer_category_pivot = customer_category_pivot.reset_index()
 
-    # Create summary statistics
-    category_summary = {}
-    for category in customer_category_pivot.columns[
-        1:-1
-    ]:  # Exclude customer_id and Total_Spending
-        category_summary[category] = {
-            "total_revenue": customer_category_pivot[category].sum(),
-            "customers_purchased": (customer_category_pivot[category] > 0).sum(),
-            "average_spending": customer_category_pivot[category][
-                customer_category_pivot[category] > 0
-            ].mean(),
-            "max_spending": customer_category_pivot[category].max(),
-            "min_spending": customer_category_pivot[category][
-                customer_category_pivot[category] > 0
-            ].min(),
+    # Create summary statistics, one vectorized sweep per statistic
+    category_spending = customer_category_pivot[
+        customer_category_pivot.columns[1:-1]
+    ]  # Exclude customer_id and Total_Spending
+    purchased = category_spending > 0
+    purchased_spending = category_spending.where(purchased)
+    category_summary = pd.DataFrame(
+        {
+            "total_revenue": category_spending.sum(),
+            "customers_purchased": purchased.sum(),
+            "average_spending": purchased_spending.mean(),
+            "max_spending": category_spending.max(),
+            "min_spending": purchased_spending.min(),
         }
+    ).to_dict("index")
 
     return {
         "customer_category_totals": customer_category_pivot,
@@ -281,18 +356,36 @@ def calculate_customer_category_totals(transactions_df, products_df):
     }
 
 
+def rank_category_spending(customer_category_pivot):
+    """
+    Melt the pivot into one row per customer and category with positive spending,
+    ordered by amount (highest first; ties keep the pivot's customer order)
+    """
+    spending = customer_category_pivot.melt(
+        id_vars=["customer_id", "Total_Spending"],
+        var_name="category",
+        value_name="amount",
+    )
+    # Only include customers who actually bought in the category
+    spending = spending[spending["amount"] > 0]
+    return spending.sort_values("amount", ascending=False, kind="stable")
+
+
 def get_top_customers_per_category(customer_category_pivot):
     """Get top 5 customers for each category"""
-    top_customers = {}
+    top_5 = (
+        rank_category_spending(customer_category_pivot)
+        .groupby("category", sort=False)
+        .head(5)
+    )
 
-    for category in customer_category_pivot.columns[
-        1:-1
-    ]:  # Exclude customer_id and Total_Spending
-        top_5 = customer_category_pivot.nlargest(5, category)[["customer_id", category]]
-        top_5 = top_5[
-            top_5[category] > 0
-        ]  # Only include customers who actually bought in this category
-        top_customers[category] = top_5.to_dict("records")
+    # Exclude customer_id and Total_Spending
+    top_customers = {category: [] for category in customer_category_pivot.columns[1:-1]}
+    for category, rows in top_5.groupby("category", sort=False):
+        top_customers[category] = [
+            {"customer_id": customer_id, category: amount}
+            for customer_id, amount in zip(rows["customer_id"], rows["amount"])
+        ]
 
     return top_customers
 
@@ -302,21 +395,30 @@ def identify_top_spenders_by_category(customer_category_data):
     Identify the top spender in each category
     """
     customer_category_totals = customer_category_data["customer_category_totals"]
-    top_spenders = {}
-
-    for category in customer_category_totals.columns[
+    category_columns = customer_category_totals.columns[
         1:-1
-    ]:  # Exclude customer_id and Total_Spending
-        if customer_category_totals[category].max() > 0:
-            top_spender_idx = customer_category_totals[category].idxmax()
-            top_spender = customer_category_totals.loc[top_spender_idx]
+    ]  # Exclude customer_id and Total_Spending
+    category_revenue = customer_category_totals[category_columns].sum()
+
+    # The first row per category is its top spender
+    top_rows = (
+        rank_category_spending(customer_category_totals)
+        .groupby("category", sort=False)
+        .head(1)
+        .set_index("category")
+    )
+
+    top_spenders = {}
+    for category in category_columns:
+        if category in top_rows.index:
+            top_spender = top_rows.loc[category]
 
             top_spenders[category] = {
                 "customer_id": top_spender["customer_id"],
-                "amount_spent": top_spender[category],
+                "amount_spent": top_spender["amount"],
                 "total_spending_all_categories": top_spender["Total_Spending"],
                 "percentage_of_category": (
-                    top_spender[category] / customer_category_totals[category].sum()
+                    top_spender["amount"] / category_revenue[category]
                 )
                 * 100,
             }
@@ -324,27 +426,47 @@ def identify_top_spenders_by_category(customer_category_data):
     return top_spenders
 
 
-def rank_customers_by_total_value(transactions_df):
+def dense_rank_descending(values):
+    """
+    Dense rank with 1 for the largest value, computed from a single np.unique sort;
+    equivalent to Series.rank(method="dense", ascending=False)
+    """
+    values = np.asarray(values, dtype="float64")
+    ranks = np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    ranks[valid] = np.unique(-values[valid], return_inverse=True)[1] + 1
+    return ranks
+
+
+def rank_customers_by_total_value(transactions_df, customer_aggregates=None):
     """
     Rank all customers based on their total purchase value across all products
     """
 
     # Calculate total spending per customer
+    if customer_aggregates is None:
+        customer_aggregates = aggregate_customer_transactions(transactions_df)
     customer_totals = (
-        transactions_df.groupby("customer_id")
-        .agg({"amount": ["sum", "count", "mean"], "transaction_date": ["min", "max"]})
-        .round(2)
+        customer_aggregates[
+            [
+                "total_spent",
+                "transaction_count",
+                "avg_transaction",
+                "first_transaction",
+                "last_transaction",
+            ]
+        ]
+        .rename(
+            columns={
+                "first_transaction": "first_purchase",
+                "last_transaction": "last_purchase",
+            }
+        )
+        .reset_index()
     )
-
-    # Flatten column names
-    customer_totals.columns = [
-        "total_spent",
-        "transaction_count",
-        "avg_transaction",
-        "first_purchase",
-        "last_purchase",
-    ]
-    customer_totals = customer_totals.reset_index()
+    # Round the currency columns only; the date aggregates need no rounding
+    for column in ["total_spent", "avg_transaction"]:
+        customer_totals[column] = customer_totals[column].round(2)
 
     # Calculate customer lifetime (days between first and last purchase)
     customer_totals["customer_lifetime_days"] = (
@@ -357,30 +479,26 @@ def rank_customers_by_total_value(transactions_df):
     )
 
     # Rank customers by total spending
-    customer_totals["rank_by_total_spending"] = customer_totals["total_spent"].rank(
-        method="dense", ascending=False
+    customer_totals["rank_by_total_spending"] = dense_rank_descending(
+        customer_totals["total_spent"]
     )
 
     # Rank by transaction frequency
-    customer_totals["rank_by_frequency"] = customer_totals["transaction_count"].rank(
-        method="dense", ascending=False
+    customer_totals["rank_by_frequency"] = dense_rank_descending(
+        customer_totals["transaction_count"]
     )
 
     # Rank by average transaction value
-    customer_totals["rank_by_avg_transaction"] = customer_totals[
-        "avg_transaction"
-    ].rank(method="dense", ascending=False)
+    customer_totals["rank_by_avg_transaction"] = dense_rank_descending(
+        customer_totals["avg_transaction"]
+    )
 
     # Create customer segments based on spending
+    total_spent = customer_totals["total_spent"].to_numpy()
+    q50, q80, q95 = np.quantile(total_spent, [0.5, 0.8, 0.95])
     customer_totals["customer_segment"] = pd.cut(
         customer_totals["total_spent"],
-        bins=[
-            0,
-            customer_totals["total_spent"].quantile(0.5),
-            customer_totals["total_spent"].quantile(0.8),
-            customer_totals["total_spent"].quantile(0.95),
-            customer_totals["total_spent"].max(),
-        ],
+        bins=[0, q50, q80, q95, total_spent.max()],
         labels=["Low Value", "Medium Value", "High Value", "VIP"],
         include_lowest=True,
     )
@@ -1,233 +1,311 @@
 import pandas as pd
 import os
 from datetime import datetime
-from flask import Response, send_file, flash, redirect, url_for
-import tempfile
+from flask import Response, send_file, flash, redirect, url_for, jsonify
 import zipfile
-from io import BytesIO
+import threading
+import time
+import uuid
+import hashlib
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, TextIOWrapper
+from xml.sax.saxutils import escape
+
+
+def build_top_spenders_df(top_spenders):
+    """Top spender per category as a DataFrame, built column by column"""
+    categories = list(top_spenders)
+    spenders = [top_spenders[category] for category in categories]
+    return pd.DataFrame(
+        {
+            "Category": categories,
+            "Top_Customer_ID": [s["customer_id"] for s in spenders],
+            "Amount_Spent": [s["amount_spent"] for s in spenders],
+            "Percentage_of_Category": [s["percentage_of_category"] for s in spenders],
+            "Total_Customer_Spending": [
+                s["total_spending_all_categories"] for s in spenders
+            ],
+        }
+    )
+
+
+def build_category_summary_df(category_summary):
+    """Category performance summary as a DataFrame, built column by column"""
+    categories = list(category_summary)
+    stats = [category_summary[category] for category in categories]
+    return pd.DataFrame(
+        {
+            "Category": categories,
+            "Total_Revenue": [s["total_revenue"] for s in stats],
+            "Customers_Purchased": [s["customers_purchased"] for s in stats],
+            "Average_Spending": [s["average_spending"] for s in stats],
+            "Max_Spending": [s["max_spending"] for s in stats],
+            "Min_Spending": [s["min_spending"] for s in stats],
+        }
+    )
+
+
+def build_insights_df(recommendations):
+    """Business recommendations as a DataFrame, built column by column"""
+    return pd.DataFrame(
+        {
+            "Type": [rec["type"] for rec in recommendations],
+            "Category": [rec["category"] for rec in recommendations],
+            "Priority": [rec["priority"] for rec in recommendations],
+            "Recommendation": [rec["recommendation"] for rec in recommendations],
+            "Potential_Impact": [rec["potential_impact"] for rec in recommendations],
+        }
+    )
+
+
+def build_summary_statistics_df(summary_stats):
+    """Headline summary statistics as a two-column Metric/Value DataFrame"""
+    summary_data = {
+        "Metric": [
+            "Total Customers",
+            "Total Transactions",
+            "Total Revenue",
+            "Average Transaction Value",
+            "Average Customer Value",
+            "Product Categories",
+            "First Transaction Date",
+            "Last Transaction Date",
+            "Geocoded Customers",
+            "Geocoding Success Rate",
+        ],
+        "Value": [
+            summary_stats["total_customers"],
+            summary_stats["total_transactions"],
+            summary_stats["total_revenue"],
+            summary_stats["total_revenue"] / summary_stats["total_transactions"],
+            summary_stats["total_revenue"] / summary_stats["total_customers"],
+            summary_stats["product_categories"],
+            summary_stats["date_range"]["first_transaction"],
+            summary_stats["date_range"]["last_transaction"],
+            summary_stats.get("geocoded_customers", 0),
+            f"{summary_stats.get('geocoding_success_rate', 0):.1f}%",
+        ],
+    }
+
+    return pd.DataFrame(summary_data)
+
+
+def downcast_integer_columns(df):
+    """
+    Narrow int64 columns to the smallest integer dtype that holds their values.
+    Floats are left as float64 so exported amounts are not rounded.
+    """
+    integer_columns = df.select_dtypes("int64").columns
+    if len(integer_columns) == 0:
+        return df
+    return df.astype(
+        {
+            column: pd.to_numeric(df[column], downcast="integer").dtype
+            for column in integer_columns
+        }
+    )
+
+
+def _build_export_frames(processing_result):
+    analysis_results = processing_result["analysis_results"]
+
+    builders = {
+        "customer_rankings": lambda: analysis_results["customer_rankings"][
+            "customer_rankings"
+        ],
+        "top_spenders": lambda: build_top_spenders_df(
+            analysis_results["top_spenders_by_category"]
+        ),
+        "category_summary": lambda: build_category_summary_df(
+            analysis_results["customer_category_totals"]["category_summary"]
+        ),
+        "summary_statistics": lambda: build_summary_statistics_df(
+            processing_result["summary_stats"]
+        ),
+    }
+    recommendations = processing_result.get("insights", {}).get("recommendations")
+    if recommendations:
+        builders["insights"] = lambda: build_insights_df(recommendations)
+
+    # Narrow integer columns so both exports serialize the smaller frames
+    return {name: downcast_integer_columns(build()) for name, build in builders.items()}
+
+
+def get_export_frames(processing_result):
+    """
+    DataFrames derived from a processing result for the Excel and CSV exports.
+    They are built on first use and kept on the result under "_export_frames",
+    so downloading both formats from a cached result assembles them only once.
+    """
+    export_frames = processing_result.get("_export_frames")
+    if export_frames is None:
+        export_frames = _build_export_frames(processing_result)
+        processing_result["_export_frames"] = export_frames
+    return export_frames
+
+
+def write_sheets_xlsxwriter(buffer, sheets):
+    """Write (sheet_name, DataFrame) pairs to buffer with the XlsxWriter engine"""
+
+    # Plain strings are written as-is (no formula/URL detection)
+    with pd.ExcelWriter(
+        buffer,
+        engine="xlsxwriter",
+        engine_kwargs={
+            "options": {
+                "strings_to_numbers": False,
+                "strings_to_formulas": False,
+                "strings_to_urls": False,
+            }
+        },
+    ) as writer:
+
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def write_sheets_openpyxl(buffer, sheets):
+    """
+    Write (sheet_name, DataFrame) pairs to buffer with a write-only openpyxl
+    workbook, appending plain row tuples instead of going through to_excel
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in sheets:
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append([str(column) for column in df.columns])
+
+        # Missing values become empty cells
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+    workbook.save(buffer)
 
 
 def create_processed_excel_file(processing_result, original_filename):
     """
     Create a comprehensive Excel file with multiple sheets containing processed data
+    Returns the workbook as an in-memory BytesIO buffer
     """
 
-    # Create a temporary file
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    processed_filename = f"processed_{timestamp}_{original_filename}"
-    temp_file_path = os.path.join(tempfile.gettempdir(), processed_filename)
+    buffer = BytesIO()
 
     # Get processed data
     transactions_df = processing_result["processed_data"]["transactions_df"]
     customers_df = processing_result["processed_data"]["customers_df"]
     products_df = processing_result["processed_data"]["products_df"]
+    analysis_results = processing_result["analysis_results"]
 
-    # Create Excel writer
-    with pd.ExcelWriter(temp_file_path, engine="openpyxl") as writer:
-
-        # Sheet 1: Original Data (cleaned)
-        transactions_df.to_excel(writer, sheet_name="Transactions_Cleaned", index=False)
-        customers_df.to_excel(writer, sheet_name="Customers_Enhanced", index=False)
-        products_df.to_excel(writer, sheet_name="Products", index=False)
+    export_frames = get_export_frames(processing_result)
 
+    # Sheet 1: Original Data (cleaned)
+    sheets = [
+        ("Transactions_Cleaned", transactions_df),
+        ("Customers_Enhanced", customers_df),
+        ("Products", products_df),
         # Sheet 2: Customer Rankings
-        customer_rankings_df = pd.DataFrame(
-            processing_result["analysis_results"]["customer_rankings"][
-                "customer_rankings"
-            ]
-        )
-        customer_rankings_df.to_excel(
-            writer, sheet_name="Customer_Rankings", index=False
-        )
-
+        ("Customer_Rankings", export_frames["customer_rankings"]),
         # Sheet 3: Customer Category Totals
-        category_totals_df = processing_result["analysis_results"][
-            "customer_category_totals"
-        ]["customer_category_totals"]
-        category_totals_df.to_excel(
-            writer, sheet_name="Customer_Category_Spending", index=False
-        )
-
+        (
+            "Customer_Category_Spending",
+            analysis_results["customer_category_totals"]["customer_category_totals"],
+        ),
         # Sheet 4: Top Spenders by Category
-        top_spenders_data = []
-        for category, spender_info in processing_result["analysis_results"][
-            "top_spenders_by_category"
-        ].items():
-            top_spenders_data.append(
-                {
-                    "Category": category,
-                    "Top_Customer_ID": spender_info["customer_id"],
-                    "Amount_Spent": spender_info["amount_spent"],
-                    "Percentage_of_Category": spender_info["percentage_of_category"],
-                    "Total_Customer_Spending": spender_info[
-                        "total_spending_all_categories"
-                    ],
-                }
+        ("Top_Spenders_by_Category", export_frames["top_spenders"]),
+    ]
+
+    # Sheet 5: Address History
+    if "address_history_df" in analysis_results["address_history"]:
+        sheets.append(
+            (
+                "Address_History",
+                analysis_results["address_history"]["address_history_df"],
             )
-
-        top_spenders_df = pd.DataFrame(top_spenders_data)
-        top_spenders_df.to_excel(
-            writer, sheet_name="Top_Spenders_by_Category", index=False
         )
 
-        # Sheet 5: Address History
-        if (
-            "address_history_df"
-            in processing_result["analysis_results"]["address_history"]
-        ):
-            address_history_df = processing_result["analysis_results"][
-                "address_history"
-            ]["address_history_df"]
-            address_history_df.to_excel(
-                writer, sheet_name="Address_History", index=False
-            )
+    # Sheet 6: Category Performance Summary
+    sheets.append(("Category_Performance", export_frames["category_summary"]))
 
-        # Sheet 6: Category Performance Summary
-        category_summary_data = []
-        for category, stats in processing_result["analysis_results"][
-            "customer_category_totals"
-        ]["category_summary"].items():
-            category_summary_data.append(
-                {
-                    "Category": category,
-                    "Total_Revenue": stats["total_revenue"],
-                    "Customers_Purchased": stats["customers_purchased"],
-                    "Average_Spending": stats["average_spending"],
-                    "Max_Spending": stats["max_spending"],
-                    "Min_Spending": stats["min_spending"],
-                }
-            )
+    # Sheet 7: Summary Statistics
+    sheets.append(("Summary_Statistics", export_frames["summary_statistics"]))
 
-        category_summary_df = pd.DataFrame(category_summary_data)
-        category_summary_df.to_excel(
-            writer, sheet_name="Category_Performance", index=False
-        )
+    # Sheet 8: Business Insights (if available)
+    if "insights" in export_frames:
+        sheets.append(("Business_Insights", export_frames["insights"]))
 
-        # Sheet 7: Summary Statistics
-        summary_data = {
-            "Metric": [
-                "Total Customers",
-                "Total Transactions",
-                "Total Revenue",
-                "Average Transaction Value",
-                "Average Customer Value",
-                "Product Categories",
-                "First Transaction Date",
-                "Last Transaction Date",
-                "Geocoded Customers",
-                "Geocoding Success Rate",
-            ],
-            "Value": [
-                processing_result["summary_stats"]["total_customers"],
-                processing_result["summary_stats"]["total_transactions"],
-                processing_result["summary_stats"]["total_revenue"],
-                processing_result["summary_stats"]["total_revenue"]
-                / processing_result["summary_stats"]["total_transactions"],
-                processing_result["summary_stats"]["total_revenue"]
-                / processing_result["summary_stats"]["total_customers"],
-                processing_result["summary_stats"]["product_categories"],
-                processing_result["summary_stats"]["date_range"]["first_transaction"],
-                processing_result["summary_stats"]["date_range"]["last_transaction"],
-                processing_result["summary_stats"].get("geocoded_customers", 0),
-                f"{processing_result['summary_stats'].get('geocoding_success_rate', 0):.1f}%",
-            ],
-        }
+    try:
+        write_sheets_xlsxwriter(buffer, sheets)
+    except ImportError:
+        # XlsxWriter missing: fall back to openpyxl's streaming write-only mode
+        buffer.seek(0)
+        buffer.truncate()
+        write_sheets_openpyxl(buffer, sheets)
 
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_excel(writer, sheet_name="Summary_Statistics", index=False)
-
-        # Sheet 8: Business Insights (if available)
-        if (
-            "insights" in processing_result
-            and "recommendations" in processing_result["insights"]
-        ):
-            insights_data = []
-            for rec in processing_result["insights"]["recommendations"]:
-                insights_data.append(
-                    {
-                        "Type": rec["type"],
-                        "Category": rec["category"],
-                        "Priority": rec["priority"],
-                        "Recommendation": rec["recommendation"],
-                        "Potential_Impact": rec["potential_impact"],
-                    }
-                )
-
-            if insights_data:
-                insights_df = pd.DataFrame(insights_data)
-                insights_df.to_excel(
-                    writer, sheet_name="Business_Insights", index=False
-                )
-
-    return temp_file_path
-
-
-def create_csv_exports(processing_result, original_filename):
+    buffer.seek(0)
+    return buffer
+
+
+def write_csv_to_zip(zipf, name, df):
+    """
+    Stream a DataFrame as CSV directly into a ZIP archive entry
+    """
+    with zipf.open(name, "w", force_zip64=True) as entry:
+        with TextIOWrapper(entry, encoding="utf-8", newline="") as text:
+            df.to_csv(text, index=False)
+
+
+def create_csv_exports(
+    processing_result, original_filename, compresslevel=1, generated_on=None
+):
     """
     Create individual CSV files for each analysis and return as a ZIP file
+    held in an in-memory BytesIO buffer. CSV text compresses well even at the
+    fastest deflate level (1), which keeps export latency low.
+    generated_on is the time reported in the README (default: now).
     """
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    zip_filename = f"csv_exports_{timestamp}_{original_filename.rsplit('.', 1)[0]}.zip"
-    zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
+    if generated_on is None:
+        generated_on = datetime.now()
+
+    buffer = BytesIO()
 
     # Get processed data
     transactions_df = processing_result["processed_data"]["transactions_df"]
     customers_df = processing_result["processed_data"]["customers_df"]
     products_df = processing_result["processed_data"]["products_df"]
 
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+    with zipfile.ZipFile(
+        buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+    ) as zipf:
 
         # Add main data files
-        transactions_csv = transactions_df.to_csv(index=False)
-        zipf.writestr("01_transactions_cleaned.csv", transactions_csv)
+        write_csv_to_zip(zipf, "01_transactions_cleaned.csv", transactions_df)
 
-        customers_csv = customers_df.to_csv(index=False)
-        zipf.writestr("02_customers_enhanced.csv", customers_csv)
+        write_csv_to_zip(zipf, "02_customers_enhanced.csv", customers_df)
 
-        products_csv = products_df.to_csv(index=False)
-        zipf.writestr("03_products.csv", products_csv)
+        write_csv_to_zip(zipf, "03_products.csv", products_df)
 
         # Add analysis files
-        customer_rankings_df = pd.DataFrame(
-            processing_result["analysis_results"]["customer_rankings"][
-                "customer_rankings"
-            ]
-        )
-        rankings_csv = customer_rankings_df.to_csv(index=False)
-        zipf.writestr("04_customer_rankings.csv", rankings_csv)
+        customer_rankings_df = get_export_frames(processing_result)["customer_rankings"]
+        write_csv_to_zip(zipf, "04_customer_rankings.csv", customer_rankings_df)
 
         category_totals_df = processing_result["analysis_results"][
             "customer_category_totals"
         ]["customer_category_totals"]
-        category_csv = category_totals_df.to_csv(index=False)
-        zipf.writestr("05_customer_category_spending.csv", category_csv)
+        write_csv_to_zip(zipf, "05_customer_category_spending.csv", category_totals_df)
 
         # Add top spenders analysis
-        top_spenders_data = []
-        for category, spender_info in processing_result["analysis_results"][
-            "top_spenders_by_category"
-        ].items():
-            top_spenders_data.append(
-                {
-                    "Category": category,
-                    "Top_Customer_ID": spender_info["customer_id"],
-                    "Amount_Spent": spender_info["amount_spent"],
-                    "Percentage_of_Category": spender_info["percentage_of_category"],
-                    "Total_Customer_Spending": spender_info[
-                        "total_spending_all_categories"
-                    ],
-                }
-            )
-
-        top_spenders_df = pd.DataFrame(top_spenders_data)
-        top_spenders_csv = top_spenders_df.to_csv(index=False)
-        zipf.writestr("06_top_spenders_by_category.csv", top_spenders_csv)
+        top_spenders_df = get_export_frames(processing_result)["top_spenders"]
+        write_csv_to_zip(zipf, "06_top_spenders_by_category.csv", top_spenders_df)
 
         # Add README file
         readme_content = f"""
 # Processed Data Export - {original_filename}
-Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Generated on: {generated_on.strftime('%Y-%m-%d %H:%M:%S')}
 
 ## Files Included:
 
@@ -252,14 +330,38 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 For questions about this data, refer to the original analysis report.
 """
-        zipf.writestr("README.txt", readme_content)
+        # The README is tiny, so store it without compression
+        zipf.writestr("README.txt", readme_content, compress_type=zipfile.ZIP_STORED)
+
+    buffer.seek(0)
+    return buffer
+
+
+# KML document header and footer, pre-encoded as UTF-8 bytes
+KML_HEADER = b"""<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+    <name>Customer Locations</name>
+    <description>Customer locations from processed data</description>
+    
+    <Style id="customer-icon">
+        <IconStyle>
+            <Icon>
+                <href>http://maps.google.com/mapfiles/kml/pal2/icon26.png</href>
+            </Icon>
+        </IconStyle>
+    </Style>
+"""
 
-    return zip_path
+KML_FOOTER = b"""
+</Document>
+</kml>"""
 
 
 def create_geolocation_kml(processing_result, original_filename):
     """
     Create a KML file for viewing customer locations in Google Earth/Maps
+    Returns an in-memory BytesIO buffer, or None if no customer is geocoded
     """
 
     customers_df = processing_result["processed_data"]["customers_df"]
@@ -270,177 +372,436 @@ def create_geolocation_kml(processing_result, original_filename):
     if len(geocoded_customers) == 0:
         return None
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    kml_filename = (
-        f"customer_locations_{timestamp}_{original_filename.rsplit('.', 1)[0]}.kml"
-    )
-    kml_path = os.path.join(tempfile.gettempdir(), kml_filename)
+    # Each column is converted and XML-escaped once, before templating
+    def column_text(column, default):
+        if column not in geocoded_customers.columns:
+            return default
+        return geocoded_customers[column].astype(str).map(escape)
 
-    # Create KML content
-    kml_content = """<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-<Document>
-    <name>Customer Locations</name>
-    <description>Customer locations from processed data</description>
-    
-    <Style id="customer-icon">
-        <IconStyle>
-            <Icon>
-                <href>http://maps.google.com/mapfiles/kml/pal2/icon26.png</href>
-            </Icon>
-        </IconStyle>
-    </Style>
-"""
+    customer_id = column_text("customer_id", "")
+    name = column_text("name", "")
 
-    # Add customer placemarks
-    for _, customer in geocoded_customers.iterrows():
-        kml_content += f"""
+    # Build every placemark at once with vectorized string concatenation
+    placemarks = (
+        """
     <Placemark>
-        <name>{customer['customer_id']} - {customer['name']}</name>
+        <name>"""
+        + customer_id
+        + " - "
+        + name
+        + """</name>
         <description>
             <![CDATA[
-            <b>Customer:</b> {customer['name']}<br/>
-            <b>Email:</b> {customer['email']}<br/>
-            <b>Address:</b> {customer['address']}<br/>
-            <b>Geocoded by:</b> {customer.get('geo_provider', 'Unknown')}<br/>
-            <b>Confidence:</b> {customer.get('geo_confidence', 'N/A')}
+            <b>Customer:</b> """
+        + name
+        + """<br/>
+            <b>Email:</b> """
+        + column_text("email", "")
+        + """<br/>
+            <b>Address:</b> """
+        + column_text("address", "")
+        + """<br/>
+            <b>Geocoded by:</b> """
+        + column_text("geo_provider", "Unknown")
+        + """<br/>
+            <b>Confidence:</b> """
+        + column_text("geo_confidence", "N/A")
+        + """
             ]]>
         </description>
         <styleUrl>#customer-icon</styleUrl>
         <Point>
-            <coordinates>{customer['longitude']},{customer['latitude']},0</coordinates>
+            <coordinates>"""
+        + column_text("longitude", "")
+        + ","
+        + column_text("latitude", "")
+        + """,0</coordinates>
         </Point>
     </Placemark>"""
+    )
+    buffer = BytesIO()
+    buffer.write(KML_HEADER)
+    buffer.write("".join(placemarks.tolist()).encode("utf-8"))
+    buffer.write(KML_FOOTER)
 
-    kml_content += """
-</Document>
-</kml>"""
+    buffer.seek(0)
+    return buffer
 
-    with open(kml_path, "w", encoding="utf-8") as f:
-        f.write(kml_content)
 
-    return kml_path
+# Processing results by (file_path, mtime, geocoded), least recently used first
+PROCESSING_CACHE_SIZE = 8
+_processing_results = OrderedDict()
+_processing_results_lock = threading.Lock()
 
 
-def add_download_routes_to_app(app):
+def _remember_processing_result(key, processing_result):
+    with _processing_results_lock:
+        _processing_results[key] = processing_result
+        _processing_results.move_to_end(key)
+        while len(_processing_results) > PROCESSING_CACHE_SIZE:
+            _processing_results.popitem(last=False)
+
+
+def _cached_processing_result(key):
+    with _processing_results_lock:
+        processing_result = _processing_results.get(key)
+        if processing_result is not None:
+            _processing_results.move_to_end(key)
+        return processing_result
+
+
+def remember_processing_result(file_path, processing_result, geocoded):
     """
-    Add download routes to the Flask application
+    Keep the processing result of a saved upload for the download routes, so
+    downloads reuse the upload's own result (and its geocoding)
     """
+    key = (file_path, os.path.getmtime(file_path), geocoded)
+    _remember_processing_result(key, processing_result)
+
+
+def has_geocoded_result(file_path):
+    """Whether a geocoded processing result of the upload is cached"""
+    key = (file_path, os.path.getmtime(file_path), True)
+    return _cached_processing_result(key) is not None
+
+
+def get_processing_result(file_path, use_geolocation=True):
+    """
+    Process an uploaded file for the download routes. Results are cached by
+    (file_path, mtime) so downloading several formats processes the file once.
+    A request without geolocation reuses a geocoded result when one exists, so
+    the exports keep the coordinates shown after the upload.
+    Returns (processing_result, geocoded)
+    """
+    mtime = os.path.getmtime(file_path)
+    for geocoded in (True,) if use_geolocation else (True, False):
+        processing_result = _cached_processing_result((file_path, mtime, geocoded))
+        if processing_result is not None:
+            return processing_result, geocoded
 
     # Import process_data within the function to avoid circular imports
     from data_processing import process_data
 
-    @app.route("/download/processed-excel/<filename>")
-    def download_processed_excel(filename):
-        """Download complete processed data as Excel file"""
+    processing_result = process_data(file_path, use_geolocation=use_geolocation)
+    _remember_processing_result((file_path, mtime, use_geolocation), processing_result)
+    return processing_result, use_geolocation
+
+
+EXPORT_ERROR_LABELS = {
+    "processed-excel": "processed file",
+    "csv-export": "CSV export",
+    "geolocation-kml": "KML file",
+}
+
+# Exports whose content names the upload (the CSV README), so their cache
+# entries are also keyed by filename
+FILENAME_KEYED_EXPORTS = {"csv-export"}
+
+# Background executor and pending jobs for asynchronous downloads
+download_executor = ThreadPoolExecutor(max_workers=4)
+download_jobs = {}
+download_jobs_lock = threading.Lock()
+
+# Seconds a finished job is kept for its result to be collected
+DOWNLOAD_JOB_TTL = 15 * 60
+
+
+def _expire_download_jobs():
+    """Drop finished jobs nobody collected within DOWNLOAD_JOB_TTL"""
+    now = time.monotonic()
+    expired = [
+        job_id
+        for job_id, job in download_jobs.items()
+        if job["finished"] is not None and now - job["finished"] > DOWNLOAD_JOB_TTL
+    ]
+    for job_id in expired:
+        future = download_jobs.pop(job_id)["future"]
+        if future.exception() is None and future.result()[0] is not None:
+            # Release the export file the job was holding for its caller
+            future.result()[0].close()
+
+
+def export_download_info(export_type, filename):
+    """Return (download_name, mimetype) for an export of an uploaded file"""
+
+    stem = filename.rsplit(".", 1)[0]
+    if export_type == "processed-excel":
+        return (
+            f"processed_{filename}",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+    if export_type == "csv-export":
+        return f"csv_export_{stem}.zip", "application/zip"
+    if export_type == "geolocation-kml":
+        return (
+            f"customer_locations_{stem}.kml",
+            "application/vnd.google-earth.kml+xml",
+        )
 
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    raise ValueError(f"Unknown export type: {export_type}")
 
-        if not os.path.exists(file_path):
-            return "Original file not found", 404
 
+def build_download(app, export_type, filename):
+    """
+    Build one export of an uploaded file
+    Returns (buffer, download_name, mimetype, geocoded); buffer is None if
+    there is nothing to export, geocoded tells whether the export was built
+    from a geocoded processing result
+    """
+
+    download_name, mimetype = export_download_info(export_type, filename)
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+
+    if export_type == "processed-excel":
+        # Process the data (cached while the file is unchanged)
+        processing_result, geocoded = get_processing_result(
+            file_path, use_geolocation=False
+        )
+
+        # Create processed Excel file
+        buffer = create_processed_excel_file(processing_result, filename)
+
+    elif export_type == "csv-export":
+        processing_result, geocoded = get_processing_result(
+            file_path, use_geolocation=False
+        )
+
+        # Create CSV export ZIP
+        # Dated by the upload, so a disk-cached export stays accurate
+        buffer = create_csv_exports(
+            processing_result,
+            filename,
+            compresslevel=app.config.get("CSV_ZIP_LEVEL", 1),
+            generated_on=datetime.fromtimestamp(os.path.getmtime(file_path)),
+        )
+
+    else:
+        processing_result, geocoded = get_processing_result(
+            file_path, use_geolocation=True
+        )
+
+        # Create KML file
+        buffer = create_geolocation_kml(processing_result, filename)
+
+    return buffer, download_name, mimetype, geocoded
+
+
+@lru_cache(maxsize=32)
+def _file_digest(file_path, mtime):
+    with open(file_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _evict_cached_exports(cache_dir, max_files):
+    """Remove the least recently used export files beyond max_files"""
+    entries = [
+        entry
+        for entry in os.scandir(cache_dir)
+        if entry.is_file() and not entry.name.endswith(".tmp")
+    ]
+    if len(entries) <= max_files:
+        return
+
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[: len(entries) - max_files]:
         try:
-            # Re-process the data to get results
-            processing_result = process_data(file_path, use_geolocation=True)
+            os.remove(entry.path)
+        except OSError:
+            pass
 
-            # Create processed Excel file
-            processed_file_path = create_processed_excel_file(
-                processing_result, filename
-            )
 
-            # Send file and clean up
-            return send_file(
-                processed_file_path,
-                as_attachment=True,
-                download_name=f"processed_{filename}",
-                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+def build_cached_download(app, export_type, filename):
+    """
+    Like build_download, but generated exports are kept on disk keyed by the
+    upload's content hash, so a repeat download sends the stored file
+    Returns (file, download_name, mimetype), where file is an open binary
+    file object, or None if there is nothing to export
+    """
 
-        except Exception as e:
-            app.logger.error(f"Error creating processed file: {str(e)}")
-            return f"Error creating processed file: {str(e)}", 500
-        finally:
-            # Clean up temporary file
-            if "processed_file_path" in locals() and os.path.exists(
-                processed_file_path
-            ):
-                try:
-                    os.remove(processed_file_path)
-                except:
-                    pass
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    digest = _file_digest(file_path, os.path.getmtime(file_path))
+    # Absolute, since send_file resolves relative paths against the app root
+    cache_dir = os.path.abspath(app.config["EXPORT_CACHE_FOLDER"])
+
+    def cache_path(geocoded):
+        cache_name = f"{digest}_{export_type}_{'geo' if geocoded else 'plain'}"
+        if export_type in FILENAME_KEYED_EXPORTS:
+            cache_name += f"_{hashlib.sha1(filename.encode()).hexdigest()[:16]}"
+        return os.path.join(cache_dir, cache_name)
+
+    # A geocoded export is always preferred; a plain Excel/CSV export is only
+    # served while no geocoded result of the upload is available
+    candidates = [True]
+    if export_type != "geolocation-kml" and not has_geocoded_result(file_path):
+        candidates.append(False)
+    for geocoded in candidates:
+        cached_path = cache_path(geocoded)
+        try:
+            # The open handle keeps the file readable even if a concurrent
+            # eviction removes it before it is sent
+            cached_file = open(cached_path, "rb")
+        except FileNotFoundError:
+            continue
+        try:
+            # Refresh the mtime so eviction treats it as recently used
+            os.utime(cached_path)
+        except FileNotFoundError:
+            pass
+        return (cached_file, *export_download_info(export_type, filename))
+
+    buffer, download_name, mimetype, geocoded = build_download(
+        app, export_type, filename
+    )
+    if buffer is None:
+        return None, download_name, mimetype
+
+    # Named after the processing result the export was actually built from
+    cached_path = cache_path(geocoded)
+
+    # Write under a temporary name first so readers never see a partial file
+    temp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp_path, cached_path)
+    except BaseException:
+        # Eviction skips .tmp files, so a failed write must clean up after itself
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
 
-    @app.route("/download/csv-export/<filename>")
-    def download_csv_export(filename):
-        """Download all data as CSV files in a ZIP archive"""
+    _evict_cached_exports(cache_dir, app.config.get("EXPORT_CACHE_MAX_FILES", 32))
+
+    # Send the generated bytes directly rather than re-opening the cache file
+    buffer.seek(0)
+    return buffer, download_name, mimetype
 
+
+def add_download_routes_to_app(app):
+    """
+    Add download routes to the Flask application
+    """
+
+    def send_download(export_type, filename):
         file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
 
         if not os.path.exists(file_path):
             return "Original file not found", 404
 
+        label = EXPORT_ERROR_LABELS[export_type]
         try:
-            # Re-process the data
-            processing_result = process_data(file_path, use_geolocation=True)
+            export_file, download_name, mimetype = build_cached_download(
+                app, export_type, filename
+            )
 
-            # Create CSV export ZIP
-            zip_file_path = create_csv_exports(processing_result, filename)
+            if export_file is None:
+                return "No geolocation data available for KML export", 400
 
-            # Send file and clean up
             return send_file(
-                zip_file_path,
+                export_file,
                 as_attachment=True,
-                download_name=f"csv_export_{filename.rsplit('.', 1)[0]}.zip",
-                mimetype="application/zip",
+                download_name=download_name,
+                mimetype=mimetype,
             )
 
         except Exception as e:
-            app.logger.error(f"Error creating CSV export: {str(e)}")
-            return f"Error creating CSV export: {str(e)}", 500
-        finally:
-            # Clean up temporary file
-            if "zip_file_path" in locals() and os.path.exists(zip_file_path):
-                try:
-                    os.remove(zip_file_path)
-                except:
-                    pass
+            app.logger.error(f"Error creating {label}: {str(e)}")
+            return f"Error creating {label}: {str(e)}", 500
+
+    @app.route("/download/processed-excel/<filename>")
+    def download_processed_excel(filename):
+        """Download complete processed data as Excel file"""
+        return send_download("processed-excel", filename)
+
+    @app.route("/download/csv-export/<filename>")
+    def download_csv_export(filename):
+        """Download all data as CSV files in a ZIP archive"""
+        return send_download("csv-export", filename)
 
     @app.route("/download/geolocation-kml/<filename>")
     def download_geolocation_kml(filename):
         """Download customer locations as KML file for Google Earth/Maps"""
+        return send_download("geolocation-kml", filename)
 
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    @app.route("/download/jobs/<export_type>/<filename>", methods=["POST"])
+    def start_download_job(export_type, filename):
+        """Start building an export in the background and return its job id"""
 
+        if export_type not in EXPORT_ERROR_LABELS:
+            return jsonify({"error": "Unknown export type"}), 404
+
+        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
         if not os.path.exists(file_path):
-            return "Original file not found", 404
+            return jsonify({"error": "Original file not found"}), 404
 
-        try:
-            # Re-process the data
-            processing_result = process_data(file_path, use_geolocation=True)
+        job_id = uuid.uuid4().hex
+        future = download_executor.submit(
+            build_cached_download, app, export_type, filename
+        )
+        job = {"export_type": export_type, "future": future, "finished": None}
+        future.add_done_callback(lambda _: job.update(finished=time.monotonic()))
+        with download_jobs_lock:
+            _expire_download_jobs()
+            download_jobs[job_id] = job
+
+        return (
+            jsonify(
+                {
+                    "job_id": job_id,
+                    "status_url": url_for("download_job_status", job_id=job_id),
+                    "result_url": url_for("download_job_result", job_id=job_id),
+                }
+            ),
+            202,
+        )
 
-            # Create KML file
-            kml_file_path = create_geolocation_kml(processing_result, filename)
+    @app.route("/download/jobs/<job_id>/status")
+    def download_job_status(job_id):
+        """Report whether a background export is ready: 202 pending, 200 done"""
 
-            if not kml_file_path:
-                return "No geolocation data available for KML export", 400
+        with download_jobs_lock:
+            job = download_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown download job"}), 404
 
-            # Send file and clean up
-            return send_file(
-                kml_file_path,
-                as_attachment=True,
-                download_name=f"customer_locations_{filename.rsplit('.', 1)[0]}.kml",
-                mimetype="application/vnd.google-earth.kml+xml",
-            )
+        if not job["future"].done():
+            return jsonify({"job_id": job_id, "status": "pending"}), 202
+        return jsonify({"job_id": job_id, "status": "done"}), 200
+
+    @app.route("/download/jobs/<job_id>")
+    def download_job_result(job_id):
+        """Send a finished background export, or 202 while it is still running"""
+
+        with download_jobs_lock:
+            job = download_jobs.get(job_id)
+            if job is None:
+                return jsonify({"error": "Unknown download job"}), 404
+
+            export_type, future = job["export_type"], job["future"]
+            if not future.done():
+                return jsonify({"job_id": job_id, "status": "pending"}), 202
 
+            # Finished jobs are handed out once
+            del download_jobs[job_id]
+
+        label = EXPORT_ERROR_LABELS[export_type]
+        try:
+            export_file, download_name, mimetype = future.result()
         except Exception as e:
-            app.logger.error(f"Error creating KML file: {str(e)}")
-            return f"Error creating KML file: {str(e)}", 500
-        finally:
-            # Clean up temporary file
-            if "kml_file_path" in locals() and os.path.exists(kml_file_path):
-                try:
-                    os.remove(kml_file_path)
-                except:
-                    pass
+            app.logger.error(f"Error creating {label}: {str(e)}")
+            return f"Error creating {label}: {str(e)}", 500
+
+        if export_file is None:
+            return "No geolocation data available for KML export", 400
+
+        return send_file(
+            export_file,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype,
+        )
 
     @app.route("/download/summary-report/<filename>")
     def download_summary_report(filename):
@@ -1,12 +1,148 @@
 import requests
 import time
 from typing import Dict, List, Tuple, Optional
+import numpy as np
 import pandas as pd
 from geopy.geocoders import Nominatim, GoogleV3
+from geopy.adapters import RequestsAdapter
+from urllib3.util.retry import Retry
 from geopy.exc import GeocoderTimedOut, GeocoderQuotaExceeded
 import sqlite3
-from datetime import datetime
+import re
+from functools import lru_cache
 import hashlib
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Cache statements, kept as constants so the connection's statement cache
+# reuses their compiled form on every call
+SELECT_CACHED_LOCATION_SQL = """
+    SELECT coords, normalized_address, provider, confidence_score
+    FROM geolocation_cache
+    WHERE address_hash = ?
+"""
+
+UPDATE_LAST_USED_SQL = """
+    UPDATE geolocation_cache
+    SET last_used_timestamp = ?
+    WHERE address_hash = ?
+"""
+
+# Concurrent provider requests in bulk geocoding. Nominatim stays under its
+# 1 request/second limit through the shared rate limiter; the second worker
+# only lets the next request start on schedule while a slow one is in flight.
+NOMINATIM_MAX_WORKERS = 2
+GOOGLE_MAX_WORKERS = 10
+
+# HTTP connection pool shared by every geocoder, sized for the bulk workers
+HTTP_POOL_SIZE = GOOGLE_MAX_WORKERS
+
+_http_adapter = None
+_http_adapter_lock = threading.Lock()
+
+
+def shared_http_adapter(proxies, ssl_context):
+    """
+    geopy adapter factory returning one requests-backed adapter for all
+    geocoders, so keep-alive connections are reused across services and uploads
+    """
+    global _http_adapter
+    with _http_adapter_lock:
+        if _http_adapter is None:
+            _http_adapter = RequestsAdapter(
+                proxies=proxies,
+                ssl_context=ssl_context,
+                pool_connections=HTTP_POOL_SIZE,
+                pool_maxsize=HTTP_POOL_SIZE,
+                # Back off and retry on transient server errors. 429s are not
+                # retried here: a retry would bypass the provider's token
+                # bucket, so throttling surfaces to the geocoding code instead
+                max_retries=Retry(
+                    total=3, backoff_factor=1, status_forcelist=[502, 503, 504]
+                ),
+            )
+        return _http_adapter
+
+
+# Hashes per IN (...) lookup, below SQLite's host parameter limit
+CACHE_LOOKUP_CHUNK_SIZE = 500
+
+INSERT_CACHED_LOCATION_SQL = """
+    INSERT OR REPLACE INTO geolocation_cache
+    (address_hash, original_address, normalized_address, coords,
+     provider, confidence_score, created_timestamp, last_used_timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Latitude and longitude packed into one 16-byte BLOB
+COORDS_FORMAT = struct.Struct("<dd")
+
+# Nominatim limit: 1 request per second
+NOMINATIM_MIN_REQUEST_INTERVAL = 1.1
+
+# Google Geocoding API allows 50 requests/second per project
+GOOGLE_REQUESTS_PER_SECOND = 50
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def is_missing_address(address) -> bool:
+    """Cheap scalar stand-in for pd.isna: None, empty string or NaN"""
+    return not address or address != address
+
+
+@lru_cache(maxsize=50_000)
+def normalize_address_text(address: str) -> str:
+    """Collapse whitespace and append the country; memoized for repeat addresses"""
+    cleaned = WHITESPACE_RE.sub(" ", address).strip()
+
+    # Ensure it ends with Australia if not already specified
+    lower_cleaned = cleaned.lower()
+    if "australia" not in lower_cleaned and "aus" not in lower_cleaned:
+        cleaned += ", Australia"
+
+    return cleaned
+
+
+# Geocoded results buffered before they are written to the cache in one go
+CACHE_WRITE_BATCH_SIZE = 100
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter. acquire() reserves a token under
+    the lock and sleeps outside it, so waiting callers queue up in order.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # tokens per second
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.last_refill) * self.refill_rate,
+            )
+            self.last_refill = now
+
+            # A negative balance is the wait this caller has reserved
+            self.tokens -= 1
+            wait = -self.tokens / self.refill_rate if self.tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Provider rate limits apply to the whole process, so every service, upload
+# and background download shares one bucket per provider
+nominatim_bucket = TokenBucket(1, 1 / NOMINATIM_MIN_REQUEST_INTERVAL)
+google_bucket = TokenBucket(GOOGLE_REQUESTS_PER_SECOND, GOOGLE_REQUESTS_PER_SECOND)
 
 
 class GeolocationService:
@@ -17,144 +153,199 @@ class GeolocationService:
         self.google_api_key = google_api_key
 
         # Initialize geocoders
-        self.nominatim = Nominatim(user_agent="excel_data_pipeline")
+        self.nominatim = Nominatim(
+            user_agent="excel_data_pipeline", adapter_factory=shared_http_adapter
+        )
         if use_google_api and google_api_key:
-            self.google_geocoder = GoogleV3(api_key=google_api_key)
+            self.google_geocoder = GoogleV3(
+                api_key=google_api_key, adapter_factory=shared_http_adapter
+            )
 
-        # Initialize cache database
+        # Initialize cache database, kept open for the lifetime of the service
+        self.pending_writes = []
+        self.conn = sqlite3.connect(
+            "geolocation_cache.db", check_same_thread=False, cached_statements=256
+        )
         self.init_cache_db()
 
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 1.1  # Nominatim limit: 1 request per second
+        # Rate limiting through the process-wide provider buckets
+        self.min_request_interval = NOMINATIM_MIN_REQUEST_INTERVAL
+        self.nominatim_bucket = nominatim_bucket
+        self.google_bucket = google_bucket
 
     def init_cache_db(self):
         """Initialize SQLite cache for geolocation results"""
-        conn = sqlite3.connect("geolocation_cache.db")
+        conn = self.conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+
         cursor = conn.cursor()
+
+        # Caches from before the compact schema are dropped and rebuilt
+        columns = [
+            row[1] for row in cursor.execute("PRAGMA table_info(geolocation_cache)")
+        ]
+        if columns and "coords" not in columns:
+            print("Rebuilding geolocation cache with the compact schema...")
+            cursor.execute("DROP TABLE geolocation_cache")
+
+        # Keyed directly by the binary address hash (no separate rowid B-tree);
+        # timestamps are unix seconds
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS geolocation_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                address_hash TEXT UNIQUE NOT NULL,
+                address_hash BLOB PRIMARY KEY,
                 original_address TEXT NOT NULL,
                 normalized_address TEXT,
-                latitude REAL,
-                longitude REAL,
+                coords BLOB,
                 provider TEXT,
                 confidence_score REAL,
-                created_timestamp TEXT NOT NULL,
-                last_used_timestamp TEXT NOT NULL
-            )
+                created_timestamp INTEGER NOT NULL,
+                last_used_timestamp INTEGER NOT NULL
+            ) WITHOUT ROWID
         """
         )
         conn.commit()
-        conn.close()
 
-    def get_address_hash(self, address: str) -> str:
-        """Generate a hash for the address to use as cache key"""
-        return hashlib.md5(address.lower().strip().encode()).hexdigest()
+    def close(self):
+        """Optimize and close the cache database connection"""
+        if self.conn is not None:
+            self.flush_cache_writes()
+            self.conn.execute("PRAGMA optimize")
+            self.conn.close()
+            self.conn = None
+
+    def get_address_hash(self, address: str) -> bytes:
+        """Generate a 16-byte hash for the address to use as cache key"""
+        return hashlib.blake2b(
+            address.lower().strip().encode(), digest_size=16
+        ).digest()
+
+    @staticmethod
+    def cached_row_to_location(coords, normalized_address, provider, confidence_score):
+        """Build a location dict from a cache row"""
+        latitude, longitude = (
+            COORDS_FORMAT.unpack(coords) if coords is not None else (None, None)
+        )
+        return {
+            "latitude": latitude,
+            "longitude": longitude,
+            "normalized_address": normalized_address,
+            "provider": provider,
+            "confidence_score": confidence_score,
+            "cached": True,
+        }
 
     def get_cached_location(self, address: str) -> Optional[Dict]:
         """Retrieve cached geolocation data"""
         address_hash = self.get_address_hash(address)
 
-        conn = sqlite3.connect("geolocation_cache.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT latitude, longitude, normalized_address, provider, confidence_score
-            FROM geolocation_cache 
-            WHERE address_hash = ?
-        """,
-            (address_hash,),
-        )
-
+        conn = self.conn
+        cursor = conn.execute(SELECT_CACHED_LOCATION_SQL, (address_hash,))
         result = cursor.fetchone()
 
         if result:
             # Update last used timestamp
-            cursor.execute(
-                """
-                UPDATE geolocation_cache 
-                SET last_used_timestamp = ? 
-                WHERE address_hash = ?
-            """,
-                (datetime.now().isoformat(), address_hash),
-            )
+            conn.execute(UPDATE_LAST_USED_SQL, (int(time.time()), address_hash))
             conn.commit()
 
-            conn.close()
-            return {
-                "latitude": result[0],
-                "longitude": result[1],
-                "normalized_address": result[2],
-                "provider": result[3],
-                "confidence_score": result[4],
-                "cached": True,
-            }
-
-        conn.close()
+            return self.cached_row_to_location(*result)
+
         return None
 
+    def get_cached_locations_bulk(self, addresses: List[str]) -> Dict[bytes, Dict]:
+        """
+        Retrieve cached geolocation data for many addresses at once
+        Returns a dict keyed by address hash; addresses not cached are absent
+        """
+        address_hashes = list(dict.fromkeys(map(self.get_address_hash, addresses)))
+
+        conn = self.conn
+        cached = {}
+        for start in range(0, len(address_hashes), CACHE_LOOKUP_CHUNK_SIZE):
+            chunk = address_hashes[start : start + CACHE_LOOKUP_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                f"""
+                SELECT address_hash, coords, normalized_address, provider,
+                       confidence_score
+                FROM geolocation_cache
+                WHERE address_hash IN ({placeholders})
+            """,
+                chunk,
+            )
+            for address_hash, *location in rows:
+                cached[address_hash] = self.cached_row_to_location(*location)
+
+        if cached:
+            # Update last used timestamps in a single transaction
+            timestamp = int(time.time())
+            with conn:
+                conn.executemany(
+                    UPDATE_LAST_USED_SQL,
+                    [(timestamp, address_hash) for address_hash in cached],
+                )
+
+        return cached
+
     def cache_location(self, address: str, location_data: Dict):
         """Cache geolocation results"""
-        address_hash = self.get_address_hash(address)
-        timestamp = datetime.now().isoformat()
+        self.queue_cache_location(address, location_data)
+        self.flush_cache_writes()
 
-        conn = sqlite3.connect("geolocation_cache.db")
-        cursor = conn.cursor()
+    def queue_cache_location(self, address: str, location_data: Dict):
+        """
+        Buffer a geolocation result for the cache; buffered results are
+        written together by flush_cache_writes
+        """
+        address_hash = self.get_address_hash(address)
+        timestamp = int(time.time())
+
+        latitude = location_data.get("latitude")
+        longitude = location_data.get("longitude")
+        coords = (
+            COORDS_FORMAT.pack(latitude, longitude)
+            if latitude is not None and longitude is not None
+            else None
+        )
 
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO geolocation_cache 
-            (address_hash, original_address, normalized_address, latitude, longitude, 
-             provider, confidence_score, created_timestamp, last_used_timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        self.pending_writes.append(
             (
                 address_hash,
                 address,
                 location_data.get("normalized_address", address),
-                location_data.get("latitude"),
-                location_data.get("longitude"),
+                coords,
                 location_data.get("provider", "unknown"),
                 location_data.get("confidence_score", 0.5),
                 timestamp,
                 timestamp,
-            ),
+            )
         )
 
-        conn.commit()
-        conn.close()
+        if len(self.pending_writes) >= CACHE_WRITE_BATCH_SIZE:
+            self.flush_cache_writes()
 
-    def respect_rate_limit(self):
-        """Ensure we respect API rate limits"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
+    def flush_cache_writes(self):
+        """Write all buffered cache results in a single transaction"""
+        if not self.pending_writes:
+            return
 
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            time.sleep(sleep_time)
+        with self.conn:
+            self.conn.executemany(INSERT_CACHED_LOCATION_SQL, self.pending_writes)
+        self.pending_writes = []
 
-        self.last_request_time = time.time()
+    def respect_rate_limit(self):
+        """Ensure we respect the Nominatim rate limit"""
+        self.nominatim_bucket.acquire()
 
     def clean_address(self, address: str) -> str:
         """Clean and normalize address for better geocoding results"""
-        if not address or pd.isna(address):
+        if is_missing_address(address):
             return ""
 
-        # Basic cleaning
-        cleaned = str(address).strip()
-
-        # Remove extra whitespace
-        cleaned = " ".join(cleaned.split())
-
-        # Ensure it ends with Australia if not already specified
-        if "australia" not in cleaned.lower() and "aus" not in cleaned.lower():
-            cleaned += ", Australia"
-
-        return cleaned
+        return normalize_address_text(str(address))
 
     def geocode_with_nominatim(self, address: str) -> Optional[Dict]:
         """Geocode using Nominatim (OpenStreetMap) - Free"""
@@ -190,6 +381,8 @@ class GeolocationService:
             return None
 
         try:
+            self.google_bucket.acquire()
+
             location = self.google_geocoder.geocode(
                 address,
                 timeout=10,
@@ -212,21 +405,43 @@ class GeolocationService:
 
         return None
 
+    @staticmethod
+    def failed_result(address, error: str) -> Dict:
+        """Result for an address that could not be geocoded"""
+        return {
+            "original_address": address,
+            "latitude": None,
+            "longitude": None,
+            "normalized_address": None,
+            "provider": None,
+            "confidence_score": 0.0,
+            "cached": False,
+            "error": error,
+        }
+
+    def geocode_with_providers(self, cleaned_address: str) -> Optional[Dict]:
+        """
+        Geocode a cleaned address with the API providers, without the cache
+        Safe to call from several threads at once
+        """
+        result = None
+
+        # Try Google first if available (higher accuracy)
+        if self.use_google_api:
+            result = self.geocode_with_google(cleaned_address)
+
+        # Fallback to Nominatim (free)
+        if not result:
+            result = self.geocode_with_nominatim(cleaned_address)
+
+        return result
+
     def geocode_address(self, address: str) -> Dict:
         """
         Geocode a single address with fallback providers and caching
         """
-        if not address or pd.isna(address):
-            return {
-                "original_address": address,
-                "latitude": None,
-                "longitude": None,
-                "normalized_address": None,
-                "provider": None,
-                "confidence_score": 0.0,
-                "cached": False,
-                "error": "Empty address",
-            }
+        if is_missing_address(address):
+            return self.failed_result(address, "Empty address")
 
         cleaned_address = self.clean_address(address)
 
@@ -237,28 +452,11 @@ class GeolocationService:
             return cached_result
 
         # Try different geocoding providers
-        result = None
-
-        # Try Google first if available (higher accuracy)
-        if self.use_google_api:
-            result = self.geocode_with_google(cleaned_address)
-
-        # Fallback to Nominatim (free)
-        if not result:
-            result = self.geocode_with_nominatim(cleaned_address)
+        result = self.geocode_with_providers(cleaned_address)
 
         # If geocoding failed, return with error
         if not result:
-            return {
-                "original_address": address,
-                "latitude": None,
-                "longitude": None,
-                "normalized_address": None,
-                "provider": None,
-                "confidence_score": 0.0,
-                "cached": False,
-                "error": "Geocoding failed",
-            }
+            return self.failed_result(address, "Geocoding failed")
 
         # Cache the result
         self.cache_location(cleaned_address, result)
@@ -274,34 +472,101 @@ class GeolocationService:
         Geocode multiple addresses with progress tracking
         """
         results = []
-        unique_addresses = list(set(addresses))  # Remove duplicates
+        # Remove duplicates with pandas' hash table, keeping the first-seen
+        # order; codes map every input address back to its unique position
+        address_codes, unique_addresses = pd.factorize(
+            pd.Series(addresses, dtype=object), use_na_sentinel=False
+        )
+        unique_addresses = unique_addresses.tolist()
 
         print(f"Geocoding {len(unique_addresses)} unique addresses...")
 
-        for i, address in enumerate(unique_addresses):
-            if progress_callback:
-                progress_callback(i + 1, len(unique_addresses), address)
-
-            result = self.geocode_address(address)
-            results.append(result)
-
-            # Progress update
-            if (i + 1) % 10 == 0:
-                print(f"Processed {i + 1}/{len(unique_addresses)} addresses")
-
-        # Create a mapping for all original addresses (including duplicates)
-        address_to_result = {result["original_address"]: result for result in results}
-
-        # Return results in original order, handling duplicates
-        final_results = []
-        for address in addresses:
-            if address in address_to_result:
-                final_results.append(address_to_result[address])
-            else:
-                # Fallback for any missing addresses
-                final_results.append(self.geocode_address(address))
+        # Look up every cleaned address in the cache with one bulk query
+        cleaned_addresses = {
+            address: self.clean_address(address)
+            for address in unique_addresses
+            if not is_missing_address(address)
+        }
+        cached_locations = self.get_cached_locations_bulk(
+            list(cleaned_addresses.values())
+        )
 
-        return final_results
+        # Addresses missing from the cache are sent to the providers on worker
+        # threads, once per address hash; cache writes stay on this thread
+        max_workers = (
+            GOOGLE_MAX_WORKERS if self.use_google_api else NOMINATIM_MAX_WORKERS
+        )
+        geocoded_hashes = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            for address in unique_addresses:
+                if address not in cleaned_addresses:
+                    continue
+                address_hash = self.get_address_hash(cleaned_addresses[address])
+                if address_hash not in cached_locations and address_hash not in pending:
+                    pending[address_hash] = executor.submit(
+                        self.geocode_with_providers, cleaned_addresses[address]
+                    )
+
+            for i, address in enumerate(unique_addresses):
+                if progress_callback:
+                    progress_callback(i + 1, len(unique_addresses), address)
+
+                if address not in cleaned_addresses:
+                    # Empty address
+                    result = self.geocode_address(address)
+                else:
+                    cleaned_address = cleaned_addresses[address]
+                    address_hash = self.get_address_hash(cleaned_address)
+
+                    if address_hash in cached_locations:
+                        result = dict(
+                            cached_locations[address_hash], original_address=address
+                        )
+                    else:
+                        location = pending[address_hash].result()
+                        if not location:
+                            result = self.failed_result(address, "Geocoding failed")
+                        elif address_hash in geocoded_hashes:
+                            # Same location as an address geocoded earlier in this run
+                            result = dict(
+                                location, cached=True, original_address=address
+                            )
+                        else:
+                            self.queue_cache_location(cleaned_address, location)
+                            geocoded_hashes.add(address_hash)
+                            result = dict(location, original_address=address)
+
+                results.append(result)
+
+                # Progress update
+                if (i + 1) % 10 == 0:
+                    print(f"Processed {i + 1}/{len(unique_addresses)} addresses")
+
+        # Write the newly geocoded results in one transaction
+        self.flush_cache_writes()
+
+        # Return results in original order (including duplicates)
+        return [results[code] for code in address_codes]
+
+
+# Geocoding result keys and the customer columns they are stored in
+GEO_RESULT_COLUMNS = {
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "normalized_address": "normalized_address",
+    "provider": "geo_provider",
+    "confidence_score": "geo_confidence",
+    "cached": "geo_cached",
+    "error": "geo_error",
+}
+
+# Numeric geolocation columns, typed whatever the lookups returned
+GEO_COLUMN_DTYPES = {
+    "latitude": "float64",
+    "longitude": "float64",
+    "geo_confidence": "float64",
+}
 
 
 def add_geolocation_to_customers(
@@ -317,8 +582,10 @@ def add_geolocation_to_customers(
         use_google_api=use_google_api, google_api_key=google_api_key
     )
 
-    # Get unique addresses
-    unique_addresses = customers_df["address"].dropna().unique().tolist()
+    # Get unique addresses; codes give each customer's position among them
+    # (-1 for a missing address)
+    address_codes, unique_addresses = pd.factorize(customers_df["address"])
+    unique_addresses = unique_addresses.tolist()
 
     def progress_callback(current, total, address):
         percent = (current / total) * 100
@@ -327,44 +594,38 @@ def add_geolocation_to_customers(
         )
 
     # Geocode all unique addresses
-    geocoding_results = geo_service.geocode_addresses_bulk(
-        unique_addresses, progress_callback
+    try:
+        geocoding_results = geo_service.geocode_addresses_bulk(
+            unique_addresses, progress_callback
+        )
+    finally:
+        geo_service.close()
+
+    # One row of geolocation data per unique address, in factorized order.
+    # Coordinates are typed explicitly: failed lookups hold None, so when
+    # every lookup fails pandas would otherwise infer object columns
+    geo_df = (
+        pd.DataFrame(geocoding_results, columns=[*GEO_RESULT_COLUMNS])
+        .rename(columns=GEO_RESULT_COLUMNS)
+        .astype(GEO_COLUMN_DTYPES)
     )
 
-    # Create mapping from address to geolocation data
-    address_to_geo = {}
-    for result in geocoding_results:
-        original_addr = result["original_address"]
-        address_to_geo[original_addr] = result
-
-    # Add geolocation columns to customers DataFrame
-    customers_with_geo = customers_df.copy()
-
-    # Initialize new columns
-    customers_with_geo["latitude"] = None
-    customers_with_geo["longitude"] = None
-    customers_with_geo["normalized_address"] = None
-    customers_with_geo["geo_provider"] = None
-    customers_with_geo["geo_confidence"] = None
-    customers_with_geo["geo_cached"] = None
-    customers_with_geo["geo_error"] = None
-
-    # Populate geolocation data
-    for idx, row in customers_with_geo.iterrows():
-        address = row["address"]
-        if address in address_to_geo:
-            geo_data = address_to_geo[address]
-            customers_with_geo.at[idx, "latitude"] = geo_data.get("latitude")
-            customers_with_geo.at[idx, "longitude"] = geo_data.get("longitude")
-            customers_with_geo.at[idx, "normalized_address"] = geo_data.get(
-                "normalized_address"
-            )
-            customers_with_geo.at[idx, "geo_provider"] = geo_data.get("provider")
-            customers_with_geo.at[idx, "geo_confidence"] = geo_data.get(
-                "confidence_score"
-            )
-            customers_with_geo.at[idx, "geo_cached"] = geo_data.get("cached", False)
-            customers_with_geo.at[idx, "geo_error"] = geo_data.get("error")
+    # Spread the rows over the customers by position in one step; missing
+    # addresses (code -1) get empty rows, which are not cached results
+    customer_geo = geo_df.reindex(address_codes)
+    customer_geo["geo_cached"] = customer_geo["geo_cached"].eq(True)
+
+    # Store the repetitive provider names (and normalized addresses, when
+    # many customers share them) as categoricals
+    customer_geo["geo_provider"] = customer_geo["geo_provider"].astype("category")
+    normalized_addresses = customer_geo["normalized_address"]
+    if normalized_addresses.nunique() < len(normalized_addresses) / 2:
+        customer_geo["normalized_address"] = normalized_addresses.astype("category")
+
+    # Build the enriched frame in a single allocation
+    customers_with_geo = customers_df.assign(
+        **{column: customer_geo[column].array for column in customer_geo}
+    )
 
     # Generate summary statistics
     total_customers = len(customers_with_geo)
@@ -389,19 +650,30 @@ def add_geolocation_to_customers(
 def generate_geolocation_insights(customers_with_geo: pd.DataFrame) -> Dict:
     """Generate insights from geolocation data"""
 
-    # Filter customers with valid coordinates
-    geocoded_customers = customers_with_geo.dropna(subset=["latitude", "longitude"])
+    # Coordinates of customers with valid geolocation data, as contiguous
+    # arrays for vectorized geographic computations
+    latitudes = customers_with_geo["latitude"].to_numpy(dtype=np.float64)
+    longitudes = customers_with_geo["longitude"].to_numpy(dtype=np.float64)
+    geocoded = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    latitudes = latitudes[geocoded]
+    longitudes = longitudes[geocoded]
+    geocoded_count = len(latitudes)
 
-    if len(geocoded_customers) == 0:
+    if geocoded_count == 0:
         return {"error": "No customers have valid geolocation data"}
 
+    if "geo_confidence" in customers_with_geo:
+        confidence = customers_with_geo["geo_confidence"]
+        average_confidence = confidence.mean()
+        high_confidence_count = (confidence > 0.8).sum()
+    else:
+        average_confidence = high_confidence_count = 0
+
     insights = {
         "geocoding_stats": {
             "total_customers": len(customers_with_geo),
-            "geocoded_customers": len(geocoded_customers),
-            "geocoding_success_rate": len(geocoded_customers)
-            / len(customers_with_geo)
-            * 100,
+            "geocoded_customers": geocoded_count,
+            "geocoding_success_rate": geocoded_count / len(customers_with_geo) * 100,
             "cached_results": (
                 customers_with_geo["geo_cached"].sum()
                 if "geo_cached" in customers_with_geo
@@ -409,16 +681,10 @@ def generate_geolocation_insights(customers_with_geo: pd.DataFrame) -> Dict:
             ),
         },
         "geographic_distribution": {
-            "center_latitude": geocoded_customers["latitude"].mean(),
-            "center_longitude": geocoded_customers["longitude"].mean(),
-            "latitude_range": {
-                "min": geocoded_customers["latitude"].min(),
-                "max": geocoded_customers["latitude"].max(),
-            },
-            "longitude_range": {
-                "min": geocoded_customers["longitude"].min(),
-                "max": geocoded_customers["longitude"].max(),
-            },
+            "center_latitude": latitudes.mean(),
+            "center_longitude": longitudes.mean(),
+            "latitude_range": {"min": latitudes.min(), "max": latitudes.max()},
+            "longitude_range": {"min": longitudes.min(), "max": longitudes.max()},
         },
         "provider_stats": (
             customers_with_geo["geo_provider"].value_counts().to_dict()
@@ -426,16 +692,8 @@ def generate_geolocation_insights(customers_with_geo: pd.DataFrame) -> Dict:
             else {}
         ),
         "confidence_stats": {
-            "average_confidence": (
-                customers_with_geo["geo_confidence"].mean()
-                if "geo_confidence" in customers_with_geo
-                else 0
-            ),
-            "high_confidence_count": (
-                (customers_with_geo["geo_confidence"] > 0.8).sum()
-                if "geo_confidence" in customers_with_geo
-                else 0
-            ),
+            "average_confidence": average_confidence,
+            "high_confidence_count": high_confidence_count,
         },
     }
 
@@ -0,0 +1,32 @@
+import re
+
+import pandas as pd
+
+# One customer row: {customer_id_name_email_dob_address_created-date}. Matches
+# what strip("{}") + split("_") produced; fields past the sixth are ignored.
+CUSTOMER_ROW_PATTERN = re.compile(
+    r"^[{}]*"
+    r"(?P<customer_id>[^_]*)_(?P<name>[^_]*)_(?P<email>[^_]*)_"
+    r"(?P<dob>[^_]*)_(?P<address>[^_]*)_(?P<created_date>[^_{}]*)"
+)
+
+
+def convert_excel_date(excel_date):
+    """Convert Excel date serial numbers (a scalar or a whole Series) to datetime"""
+    # Excel epoch starts from 1900-01-01, but Excel incorrectly treats 1900 as a leap year
+    # So we need to adjust by subtracting 2 days
+    return pd.to_datetime(excel_date, origin="1899-12-30", unit="D", errors="coerce")
+
+
+def parse_customer_data(raw_data):
+    """Parse the malformed customer data from the single column format"""
+    rows = pd.Series(raw_data, dtype=object).dropna().astype(str)
+
+    # Strip the curly braces and split the underscore-separated fields in one pass
+    customers = rows.str.extract(CUSTOMER_ROW_PATTERN)
+    customers = customers.assign(
+        # Excel date serial number; rows without a valid one are skipped
+        created_date=pd.to_numeric(customers["created_date"], errors="coerce")
+    )
+
+    return customers.dropna(subset=["created_date"]).reset_index(drop=True)
@@ -0,0 +1,144 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+import pandas as pd
+
+import app as app_module
+from download import add_download_routes_to_app
+from geolocation_service import GeolocationService
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Txn Details.xlsx")
+
+
+def fake_geocode_addresses_bulk(self, addresses, progress_callback=None):
+    """Geocode every address to a fixed point without any network access"""
+    return [
+        {
+            "original_address": address,
+            "latitude": -33.0 + i / 1000,
+            "longitude": 151.0 + i / 1000,
+            "normalized_address": address,
+            "provider": "nominatim",
+            "confidence_score": 0.7,
+            "cached": False,
+            "error": None,
+        }
+        for i, address in enumerate(addresses)
+    ]
+
+
+class GeocodedUploadDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+
+        # The geolocation cache database is created in the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.workdir)
+
+        app = app_module.app
+        for key, value in {
+            "UPLOAD_FOLDER": os.path.join(self.workdir, "uploads"),
+            "EXPORT_CACHE_FOLDER": os.path.join(self.workdir, "export_cache"),
+            "DATABASE": os.path.join(self.workdir, "upload_logs.db"),
+            "DB_CONNECTION": None,
+        }.items():
+            patcher = mock.patch.dict(app.config, {key: value})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.makedirs(app.config["UPLOAD_FOLDER"])
+        os.makedirs(app.config["EXPORT_CACHE_FOLDER"])
+        app_module.init_db()
+
+        if "download_processed_excel" not in app.view_functions:
+            add_download_routes_to_app(app)
+        self.client = app.test_client()
+
+    def upload_geocoded(self):
+        with mock.patch.object(
+            GeolocationService,
+            "geocode_addresses_bulk",
+            fake_geocode_addresses_bulk,
+        ), open(WORKBOOK, "rb") as f:
+            response = self.client.post(
+                "/upload",
+                data={"file": (f, "Txn Details.xlsx"), "enable_geolocation": "on"},
+                content_type="multipart/form-data",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.upload_page = response.data.decode()
+        (filename,) = os.listdir(app_module.app.config["UPLOAD_FOLDER"])
+        return filename
+
+    def download(self, export_type, filename):
+        # Downloads must reuse the upload's geocoding, never geocode again
+        with mock.patch.object(
+            GeolocationService,
+            "geocode_addresses_bulk",
+            side_effect=AssertionError("download geocoded again"),
+        ):
+            response = self.client.get(f"/download/{export_type}/{filename}")
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        response.close()
+        return data
+
+    def test_excel_export_keeps_upload_coordinates(self):
+        filename = self.upload_geocoded()
+
+        data = self.download("processed-excel", filename)
+        customers = pd.read_excel(
+            io.BytesIO(data), sheet_name="Customers_Enhanced", engine="openpyxl"
+        )
+        self.assertTrue(customers["latitude"].notna().any())
+        self.assertTrue(customers["longitude"].notna().any())
+
+    def test_csv_export_keeps_upload_coordinates(self):
+        filename = self.upload_geocoded()
+
+        data = self.download("csv-export", filename)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            customers = pd.read_csv(archive.open("02_customers_enhanced.csv"))
+            readme = archive.read("README.txt").decode()
+        self.assertTrue(customers["latitude"].notna().any())
+        self.assertTrue(customers["longitude"].notna().any())
+        self.assertNotIn("Geocoded Customers: 0\n", readme)
+
+    def test_page_downloads_go_through_background_jobs(self):
+        filename = self.upload_geocoded()
+        job_url = f"/download/jobs/processed-excel/{filename}"
+        self.assertIn(f'data-download-job="{job_url}"', self.upload_page)
+
+        response = self.client.post(job_url)
+        self.assertEqual(response.status_code, 202)
+        job = response.get_json()
+
+        for _ in range(100):
+            status = self.client.get(job["status_url"])
+            if status.status_code != 202:
+                break
+            time.sleep(0.1)
+        self.assertEqual(status.get_json()["status"], "done")
+
+        response = self.client.get(job["result_url"])
+        self.assertEqual(response.status_code, 200)
+        customers = pd.read_excel(
+            io.BytesIO(response.data),
+            sheet_name="Customers_Enhanced",
+            engine="openpyxl",
+        )
+        response.close()
+        self.assertTrue(customers["latitude"].notna().any())
+
+        # Finished jobs are handed out once
+        self.assertEqual(self.client.get(job["status_url"]).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from geolocation_service import GeolocationService, add_geolocation_to_customers
+
+
+def failing_geocode_addresses_bulk(self, addresses, progress_callback=None):
+    """Fail every lookup, as when the providers are unreachable"""
+    return [
+        GeolocationService.failed_result(address, "Geocoding failed")
+        for address in addresses
+    ]
+
+
+class AddGeolocationToCustomersTest(unittest.TestCase):
+    def setUp(self):
+        # The geolocation cache database is created in the working directory
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.workdir)
+
+    def test_all_failed_lookups_keep_typed_columns(self):
+        customers = pd.DataFrame(
+            {
+                "customer_id": [1, 2, 3, 4],
+                "address": ["1 A St", "2 B St", "1 A St", None],
+            }
+        )
+
+        with mock.patch.object(
+            GeolocationService,
+            "geocode_addresses_bulk",
+            failing_geocode_addresses_bulk,
+        ):
+            customers_with_geo = add_geolocation_to_customers(customers)
+
+        self.assertEqual(customers_with_geo["latitude"].dtype, "float64")
+        self.assertEqual(customers_with_geo["longitude"].dtype, "float64")
+        self.assertEqual(customers_with_geo["geo_confidence"].dtype, "float64")
+        self.assertEqual(customers_with_geo["geo_cached"].dtype, "bool")
+        self.assertTrue(customers_with_geo["latitude"].isna().all())
+        self.assertFalse(customers_with_geo["geo_cached"].any())
+        self.assertEqual(
+            customers_with_geo["geo_error"].tolist()[:3], ["Geocoding failed"] * 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()